@@ -1,17 +1,123 @@
 #!/usr/bin/env python3
-import configparser
 import argparse
+import re
 import sys
 import os
-import subprocess
-import tempfile
 from collections import deque, defaultdict
+from types import MappingProxyType
+
+_KV_RE = re.compile(r'^[ \t]*([^=:;#\s\[][^=:\n]*?)[ \t]*[=:][ \t]*(.*?)[ \t\r]*$', re.M)
+_COMMENT_RE = re.compile(r'^[ \t]*[#;].*\n?', re.M)
+_SECTION_RE = re.compile(r'^[ \t]*\[([^\]\n]*)\][ \t\r]*$', re.M)
+
+def _parse_ini_body(body):
+    """Разбор строк раздела; строки с большим отступом, чем у ключа,
+    продолжают его значение, как в configparser"""
+    config_dict = {}
+    key = None
+    key_indent = 0
+    for line in body.splitlines():
+        stripped = line.strip()
+        indent = len(line) - len(line.lstrip())
+        if not stripped:
+            # Пустые строки сохраняются внутри многострочного значения
+            if key is not None:
+                config_dict[key] += '\n'
+            continue
+        
+        if key is not None and indent > key_indent:
+            config_dict[key] += '\n' + stripped
+            continue
+        
+        match = _KV_RE.match(line)
+        if match is None:
+            raise ValueError(f"неверная строка: {line!r}")
+        key = match.group(1).lower()
+        key_indent = indent
+        config_dict[key] = match.group(2)
+    
+    # Пустые строки в конце значения отбрасываются, как в configparser
+    return {k: v.rstrip() for k, v in config_dict.items()}
+
+def fast_read_ini(path):
+    """Быстрое чтение раздела [DEFAULT] INI-файла в словарь ключ -> значение"""
+    with open(path, 'rb') as f:
+        data = f.read().decode('utf-8')
+    data = _COMMENT_RE.sub('', data)
+    
+    # Берутся только строки от заголовка [DEFAULT] до следующего заголовка
+    headers = list(_SECTION_RE.finditer(data))
+    for i, header in enumerate(headers):
+        if header.group(1) == 'DEFAULT':
+            end = headers[i + 1].start() if i + 1 < len(headers) else len(data)
+            return _parse_ini_body(data[header.end():end])
+    
+    raise ValueError("не найден раздел [DEFAULT]")
+
+# Строка "пакет[@версия] -> зависимости" с одной стрелкой; последняя группа
+# ловит прочие строки со стрелкой, чтобы сообщить о них, а не пропускать молча
+_DEP_LINE = re.compile(
+    r'^[ \t]*(?:([^\s@#][^\s@]*?)(?:@([^\s>]+))?[ \t]*->[ \t]*((?:(?!->).)*?)'
+    r'|([^#\s][^\n]*?->.*?))[ \t\r]*$',
+    re.M
+)
+# Один элемент списка зависимостей целиком: имя и необязательная @версия
+_DEP_ITEM = re.compile(r'[ \t]*([^@]*?)[ \t]*(?:@.*)?')
+
+_INI_CACHE = {}
+_INI_CACHE_SIZE = 32
+
+def load_config(config_path):
+    """Загрузка конфигурации с кэшированием по (путь, mtime, размер)"""
+    try:
+        st = os.stat(config_path)
+        key = (os.path.abspath(config_path), st.st_mtime_ns, st.st_size)
+        config_dict = _INI_CACHE.get(key)
+        if config_dict is None:
+            config_dict = fast_read_ini(config_path)
+            if len(_INI_CACHE) >= _INI_CACHE_SIZE:
+                del _INI_CACHE[next(iter(_INI_CACHE))]
+            _INI_CACHE[key] = config_dict
+    except FileNotFoundError:
+        print(f"Ошибка: файл {config_path} не найден")
+        return None
+    except Exception as e:
+        print(f"Ошибка чтения конфигурации: {e}")
+        return None
+    
+    return config_dict
+
+# Демонстрационные данные для репозиториев, не заданных файлом
+_DEMO_DEPENDENCIES = {
+    'serde': ['serde_derive', 'serde_json'],
+    'serde_derive': ['proc-macro2', 'quote', 'syn'],
+    'serde_json': ['itoa', 'ryu', 'serde'],
+    'proc-macro2': ['unicode-xid'],
+    'syn': ['proc-macro2', 'quote', 'unicode-xid'],
+    'quote': ['proc-macro2'],
+    'itoa': [],
+    'ryu': [],
+    'unicode-xid': [],
+    'tokio': ['futures', 'mio', 'num_cpus'],
+    'futures': [],
+    'mio': [],
+    'num_cpus': [],
+    'reqwest': ['futures', 'http', 'url', 'serde'],
+    'http': [],
+    'url': []
+}
 
 class CargoRepository:
     def __init__(self, repo_url):
         self.repo_url = repo_url.rstrip('/')
         self.dependency_cache = {}
-        self.reverse_dependency_cache = defaultdict(list)
+        self.reverse_dependency_cache = {}
+        self._vers = []
+        self._deps = []
+        self._idx_by_name = None
+        self._reverse_index = {}
+        self._closure_cache = {}
+        self._reverse_built = False
     
     def get_package_dependencies(self, package, version):
         cache_key = f"{package}@{version}" if version else package
@@ -26,222 +132,321 @@ class CargoRepository:
             deps = self._parse_cargo_dependencies(package, version)
         
         self.dependency_cache[cache_key] = deps
-        
-        for dep in deps:
-            self.reverse_dependency_cache[dep].append(package)
-        
         return deps
     
-    def get_reverse_dependencies(self, package):
-        if package in self.reverse_dependency_cache:
-            return self.reverse_dependency_cache[package]
+    def transitive_closure(self, root, version="", exclude=(), max_depth=sys.maxsize):
+        """Обход зависимостей пакета в глубину; возвращает (граф, циклы, порядок посещения)"""
+        key = (root, version, exclude, max_depth)
+        if key in self._closure_cache:
+            return self._closure_cache[key]
         
-        if not self.reverse_dependency_cache:
-            self._build_reverse_dependency_cache()
+        graph = {}
+        cycles = []
+        order = []
+        visited = set()
+        # Текущий путь от корня хранится списком (для извлечения цикла)
+        # и множеством (для проверки принадлежности за O(1))
+        path = []
+        ancestors = set()
+        # Кадр стека - итератор по еще не пройденным зависимостям пакета из path
+        stack = []
         
+        def enter(package, package_version):
+            if len(path) >= max_depth:
+                return
+            
+            if package in ancestors:
+                cycles.append(path[path.index(package):] + [package])
+                return
+            
+            if exclude and any(sub in package for sub in exclude):
+                return
+            
+            if package in visited:
+                return
+            
+            visited.add(package)
+            order.append(package)
+            
+            dependencies = self.get_package_dependencies(package, package_version)
+            if dependencies:
+                # Пакет посещается один раз, поэтому список ребер записывается целиком
+                graph[package] = list(dependencies)
+            
+            path.append(package)
+            ancestors.add(package)
+            stack.append(iter(dependencies))
+        
+        enter(root, version)
+        while stack:
+            dep = next(stack[-1], None)
+            if dep is None:
+                stack.pop()
+                ancestors.discard(path.pop())
+            else:
+                enter(dep, "")
+        
+        result = (graph, cycles, order)
+        self._closure_cache[key] = result
+        return result
+    
+    def get_reverse_dependencies(self, package):
+        # Индекс строится целиком по всему источнику, а не по уже
+        # запрошенным пакетам, иначе результат зависел бы от порядка запросов
+        self._ensure_reverse_built()
         return self.reverse_dependency_cache.get(package, [])
     
+    def reverse_dependencies_view(self):
+        """Индекс обратных зависимостей только для чтения, без копирования"""
+        self._ensure_reverse_built()
+        return MappingProxyType(self.reverse_dependency_cache)
+    
+    def _ensure_reverse_built(self):
+        if not self._reverse_built:
+            self._build_reverse_dependency_cache()
+            self._reverse_built = True
+    
     def _build_reverse_dependency_cache(self):
         if self.repo_url.startswith('file://'):
             filepath = self.repo_url[7:]
-            self._build_reverse_cache_from_file(filepath)
-    
-    def _build_reverse_cache_from_file(self, filepath):
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line and '->' in line:
-                        parts = line.split('->')
-                        pkg_info = parts[0].strip()
-                        
-                        if '@' in pkg_info:
-                            pkg_name, _ = pkg_info.split('@')
-                        else:
-                            pkg_name = pkg_info
-                        
-                        deps = [p.strip() for p in parts[1].split(',')]
-                        clean_deps = [d.split('@')[0] for d in deps if d.strip()]
-                        
-                        for dep in clean_deps:
-                            self.reverse_dependency_cache[dep].append(pkg_name)
-        except Exception as e:
-            print(f"Ошибка построения кэша обратных зависимостей: {e}")
-    
-    def _parse_test_file(self, filepath, package, version):
+            self._ensure_loaded(filepath)
+            for dep, dependents in self._reverse_index.items():
+                self.reverse_dependency_cache.setdefault(dep, []).extend(dependents)
+        else:
+            for package, deps in _DEMO_DEPENDENCIES.items():
+                for dep in deps:
+                    self.reverse_dependency_cache.setdefault(dep, []).append(package)
+    
+    def _ensure_loaded(self, filepath):
+        if self._idx_by_name is None:
+            self._load_file_index(filepath)
+    
+    def _load_file_index(self, filepath):
+        # Индекс хранится параллельными массивами: строка i файла описывает
+        # версию self._vers[i] с зависимостями self._deps[i]; номера строк
+        # пакета лежат в self._idx_by_name. Обратные зависимости собираются
+        # в том же проходе
+        vers, deps = [], []
+        idx_by_name = defaultdict(list)
+        reverse_index = defaultdict(list)
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line and '->' in line:
-                        parts = line.split('->')
-                        pkg_info = parts[0].strip()
-                        
-                        if '@' in pkg_info:
-                            pkg_name, pkg_ver = pkg_info.split('@')
-                        else:
-                            pkg_name, pkg_ver = pkg_info, ''
-                        
-                        if pkg_name == package and (not version or pkg_ver == version):
-                            deps = [p.strip() for p in parts[1].split(',')]
-                            clean_deps = [d.split('@')[0] for d in deps if d.strip()]
-                            return clean_deps
+            with open(filepath, 'rb') as f:
+                data = f.read()
+            
+            # Все строки вида "пакет[@версия] -> зависимости" находятся одним
+            # проходом регулярного выражения по всему файлу
+            for pkg_name, pkg_ver, tail, bad_line in _DEP_LINE.findall(data.decode('utf-8')):
+                if bad_line:
+                    print(f"Предупреждение: строка пропущена, неверный формат: {bad_line}")
+                    continue
+                
+                pkg_name = sys.intern(pkg_name)
+                clean_deps = []
+                for item in tail.split(','):
+                    dep = _DEP_ITEM.fullmatch(item).group(1)
+                    if dep:
+                        clean_deps.append(sys.intern(dep))
+                idx_by_name[pkg_name].append(len(vers))
+                vers.append(pkg_ver)
+                deps.append(clean_deps)
+                for dep in clean_deps:
+                    reverse_index[dep].append(pkg_name)
         except FileNotFoundError:
             print(f"Ошибка: файл {filepath} не найден")
         except Exception as e:
             print(f"Ошибка чтения файла: {e}")
         
+        self._vers, self._deps = vers, deps
+        self._idx_by_name = dict(idx_by_name)
+        self._reverse_index = dict(reverse_index)
+    
+    def _parse_test_file(self, filepath, package, version):
+        self._ensure_loaded(filepath)
+        
+        # Первая подходящая строка побеждает, как и при линейном поиске
+        for i in self._idx_by_name.get(package, ()):
+            if not version or self._vers[i] == version:
+                return self._deps[i]
         return []
     
     def _parse_cargo_dependencies(self, package, version):
-        demo_dependencies = {
-            'serde': ['serde_derive', 'serde_json'],
-            'serde_derive': ['proc-macro2', 'quote', 'syn'],
-            'serde_json': ['itoa', 'ryu', 'serde'],
-            'proc-macro2': ['unicode-xid'],
-            'syn': ['proc-macro2', 'quote', 'unicode-xid'],
-            'quote': ['proc-macro2'],
-            'itoa': [],
-            'ryu': [],
-            'unicode-xid': [],
-            'tokio': ['futures', 'mio', 'num_cpus'],
-            'futures': [],
-            'mio': [],
-            'num_cpus': [],
-            'reqwest': ['futures', 'http', 'url', 'serde'],
-            'http': [],
-            'url': []
-        }
-        return demo_dependencies.get(package, [])
+        return _DEMO_DEPENDENCIES.get(package, [])
 
 class DependencyGraph:
     def __init__(self, repository):
         self.repository = repository
-        self.graph = defaultdict(list)
+        # Смежность хранится множествами, чтобы ребра не дублировались
+        self.graph = defaultdict(set)
         self.visited = set()
+        # Посещенные пакеты в порядке обхода, для детерминированного get_load_order()
+        self._visit_order = []
         self.cycles = []
-        self.load_order = []
+        self._exclude = ()
     
-    def build_graph_bfs_recursive(self, start_package, start_version="", max_depth=float('inf'), 
-                                 exclude_substring="", current_depth=0, path=None):
-        if path is None:
-            path = []
-        
-        if current_depth >= max_depth:
-            return
-        
-        if start_package in path:
-            cycle = path[path.index(start_package):] + [start_package]
-            self.cycles.append(cycle)
-            return
-        
-        if exclude_substring and exclude_substring in start_package:
-            return
-        
+    def build_graph_bfs_recursive(self, start_package, start_version="", max_depth=sys.maxsize, 
+                                 exclude_substring=""):
+        start_package = sys.intern(start_package)
+        # Пакет уже в графе: его зависимости и циклы добавлены прежним обходом
         if start_package in self.visited:
             return
         
-        self.visited.add(start_package)
-        self.load_order.append(start_package)
-        current_path = path + [start_package]
+        # Несколько исключаемых подстрок можно перечислить через запятую
+        self._exclude = tuple(s.strip() for s in exclude_substring.split(',') if s.strip())
         
-        dependencies = self.repository.get_package_dependencies(start_package, start_version)
+        graph, cycles, order = self.repository.transitive_closure(
+            start_package, start_version, self._exclude, max_depth
+        )
         
-        for dep in dependencies:
-            self.graph[start_package].append(dep)
-            self.build_graph_bfs_recursive(
-                dep, "", max_depth, exclude_substring, 
-                current_depth + 1, current_path
-            )
-    
-    def generate_graphviz_dot(self):
-        """Генерация представления графа на языке Graphviz DOT"""
-        dot_lines = ["digraph Dependencies {"]
-        dot_lines.append("  rankdir=TB;")
-        dot_lines.append("  node [shape=box, style=filled, fillcolor=lightblue];")
-        dot_lines.append("  edge [color=darkgreen];")
+        # Результат закэширован в репозитории, поэтому копируется,
+        # чтобы reset() и дальнейшие изменения графа его не затрагивали
+        for package, dependencies in graph.items():
+            self.graph[package].update(dependencies)
+        self.cycles.extend(list(cycle) for cycle in cycles)
+        self._visit_order.extend(p for p in order if p not in self.visited)
+        self.visited.update(order)
+    
+    def _emit_dot(self, write):
+        """Построчная выдача графа на языке Graphviz DOT через функцию write"""
+        write("digraph Dependencies {\n")
+        write("  rankdir=TB;\n")
+        write("  node [shape=box, style=filled, fillcolor=lightblue];\n")
+        write("  edge [color=darkgreen];\n")
+        
+        # Имена в кавычках готовятся один раз на узел, а не на каждое ребро
+        nodes = self.graph.keys() | {t for targets in self.graph.values() for t in targets}
+        quoted = {node: '"' + node + '"' for node in nodes}
         
         # Добавляем узлы и ребра
         for source, targets in self.graph.items():
-            for target in targets:
-                dot_lines.append(f'  "{source}" -> "{target}";')
+            prefix = '  ' + quoted[source] + ' -> '
+            for target in sorted(targets):
+                write(prefix + quoted[target] + ';\n')
         
         # Выделяем циклические зависимости красным цветом
         if self.cycles:
-            dot_lines.append("  edge [color=red];")
+            write("  edge [color=red];\n")
             for cycle in self.cycles:
                 for i in range(len(cycle) - 1):
-                    dot_lines.append(f'  "{cycle[i]}" -> "{cycle[i+1]}";')
+                    write('  ' + quoted[cycle[i]] + ' -> ' + quoted[cycle[i + 1]] + ';\n')
         
-        dot_lines.append("}")
-        return "\n".join(dot_lines)
+        write("}\n")
+    
+    def generate_graphviz_dot(self):
+        """Генерация представления графа на языке Graphviz DOT"""
+        dot_parts = []
+        self._emit_dot(dot_parts.append)
+        return "".join(dot_parts).rstrip("\n")
     
     def display_graph(self):
         """Вывод графа на экран"""
-        dot_content = self.generate_graphviz_dot()
         print("Граф зависимостей в формате Graphviz DOT:")
-        print(dot_content)
-        return dot_content
+        self._emit_dot(sys.stdout.write)
+    
+    def write_dot(self, path):
+        """Запись представления графа в DOT-файл; возвращает путь к нему"""
+        with open(path, 'w', encoding='utf-8') as dot_file:
+            self._emit_dot(dot_file.write)
+        return path
     
     def save_graph_image(self, filename):
         """Сохранение графа в файл изображения"""
+        # Импортируется лениво: нужен только для сохранения изображений (этап 5)
+        import subprocess
+        
         try:
-            dot_content = self.generate_graphviz_dot()
-            
-            # Создаем временный файл .dot
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.dot', delete=False) as dot_file:
-                dot_file.write(dot_content)
-                dot_filename = dot_file.name
-            
-            # Конвертируем в PNG с помощью Graphviz
+            # DOT передается Graphviz через stdin, без временного файла
             result = subprocess.run(
-                ['dot', '-Tpng', dot_filename, '-o', filename],
-                capture_output=True, text=True
+                ['dot', '-Tpng', '-o', filename],
+                input=self.generate_graphviz_dot(), capture_output=True, text=True
             )
-            
-            # Удаляем временный файл
-            os.unlink(dot_filename)
-            
-            if result.returncode == 0:
-                print(f"Изображение графа сохранено в файл: {filename}")
-                return True
-            else:
-                print(f"Ошибка генерации изображения: {result.stderr}")
-                return False
-                
         except FileNotFoundError:
             print("Ошибка: Graphviz не установлен. Установите его для генерации изображений.")
             return False
         except Exception as e:
             print(f"Ошибка сохранения изображения: {e}")
             return False
+        
+        if result.returncode != 0:
+            print(f"Ошибка генерации изображения: {result.stderr}")
+            return False
+        
+        print(f"Изображение графа сохранено в файл: {filename}")
+        return True
     
     def get_load_order(self):
-        return self.load_order
+        """Порядок загрузки: топологическая сортировка графа алгоритмом Кана
+        
+        Зависимости идут раньше зависящих от них пакетов, при равенстве -
+        в порядке обхода. Если все оставшиеся пакеты ждут циклических
+        зависимостей, цикл разрывается: от первого оставшегося пакета в
+        порядке обхода идем по первой незагруженной зависимости, пока не
+        вернемся в уже пройденный пакет; он лежит на цикле и загружается.
+        """
+        # Учитываются только посещенные пакеты: ребра к пакетам, отсеченным
+        # по глубине или исключенным по подстроке, в порядок не попадают.
+        # pending - число еще не загруженных зависимостей пакета
+        pending = {}
+        deps_of = {}
+        dependents = defaultdict(list)
+        for package in self._visit_order:
+            deps = [dep for dep in sorted(self.graph.get(package, ())) if dep in self.visited]
+            deps_of[package] = deps
+            pending[package] = len(deps)
+            for dep in deps:
+                dependents[dep].append(package)
+        
+        queue = deque(package for package, count in pending.items() if count == 0)
+        order = []
+        while len(order) < len(pending):
+            if not queue:
+                package = next(p for p, count in pending.items() if count > 0)
+                walked = set()
+                while package not in walked:
+                    walked.add(package)
+                    package = next(dep for dep in deps_of[package] if pending[dep] > 0)
+                pending[package] = 0
+                queue.append(package)
+            
+            package = queue.popleft()
+            order.append(package)
+            for dependent in dependents[package]:
+                if pending[dependent] > 0:
+                    pending[dependent] -= 1
+                    if pending[dependent] == 0:
+                        queue.append(dependent)
+        
+        return order
     
-    def get_reverse_dependencies(self, package, max_depth=float('inf')):
-        reverse_deps = set()
-        visited = set()
+    def get_reverse_dependencies(self, package, max_depth=sys.maxsize):
+        # Пакет помечается при постановке в очередь, поэтому попадает в нее не более одного раза
+        seen = {package}
         queue = deque([(package, 0)])
         
         while queue:
             current_pkg, depth = queue.popleft()
             
-            if depth >= max_depth or current_pkg in visited:
+            if depth >= max_depth:
                 continue
             
-            visited.add(current_pkg)
-            dependents = self.repository.get_reverse_dependencies(current_pkg)
-            
-            for dependent in dependents:
-                if dependent not in visited:
-                    reverse_deps.add(dependent)
-                    queue.append((dependent, depth + 1))
+            for dependent in self.repository.get_reverse_dependencies(current_pkg):
+                if dependent in seen:
+                    continue
+                seen.add(dependent)
+                queue.append((dependent, depth + 1))
         
-        return list(reverse_deps)
+        seen.discard(package)
+        return list(seen)
     
     def get_graph(self):
-        return dict(self.graph)
+        """Копия графа со смежностью в виде отсортированных списков
+        
+        Для однократного обхода без копирования используйте iter_graph().
+        """
+        return {package: sorted(targets) for package, targets in self.graph.items()}
+    
+    def iter_graph(self):
+        """Представление пар (пакет, множество зависимостей) без копирования"""
+        return self.graph.items()
     
     def get_cycles(self):
         return self.cycles
@@ -249,60 +454,110 @@ class DependencyGraph:
     def reset(self):
         self.graph.clear()
         self.visited.clear()
+        self._visit_order.clear()
         self.cycles.clear()
-        self.load_order.clear()
 
-def run_stage1(config_path):
-    """Выполнение этапа 1"""
-    print("=== ЭТАП 1: МИНИМАЛЬНЫЙ ПРОТОТИП С КОНФИГУРАЦИЕЙ ===")
-    
-    # 1. Чтение INI конфигурации
-    if not os.path.exists(config_path):
-        print(f"Ошибка: файл {config_path} не найден")
-        return 1
+# Меньшие группы не окупают запуск отдельного процесса dot
+_DOT_FILES_PER_WORKER = 8
+
+def _run_dot_batch(dot_paths):
+    # Импортируется лениво: нужен только для сохранения изображений (этап 5)
+    import subprocess
+    # С ключом -O Graphviz пишет рядом с каждым file.dot файл file.dot.png
+    return subprocess.run(
+        ['dot', '-Tpng', '-O', *dot_paths],
+        capture_output=True, text=True
+    )
+
+def save_graph_images(graphs):
+    """Сохранение нескольких графов в PNG пакетными запусками Graphviz
+    
+    graphs - список пар (DependencyGraph, имя файла изображения).
+    Файлы обрабатываются одним процессом dot; параллельные процессы
+    (не больше числа ядер) запускаются, только когда на каждый приходится
+    не меньше _DOT_FILES_PER_WORKER файлов.
+    """
+    # Импортируются лениво: нужны только для сохранения изображений (этап 5)
+    import shutil
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    
+    if not graphs:
+        return True
+    
+    if len(graphs) == 1:
+        # Один граф передается Graphviz через stdin, без временного каталога
+        graph, filename = graphs[0]
+        return graph.save_graph_image(filename)
     
-    config = configparser.ConfigParser()
     try:
-        config.read(config_path)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dot_paths = [
+                graph.write_dot(os.path.join(tmpdir, f"graph{i}.dot"))
+                for i, (graph, _) in enumerate(graphs)
+            ]
+            
+            workers = max(1, min(os.cpu_count() or 1, len(dot_paths) // _DOT_FILES_PER_WORKER))
+            batches = [dot_paths[i::workers] for i in range(workers)]
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(_run_dot_batch, batches))
+            except FileNotFoundError:
+                print("Ошибка: Graphviz не установлен. Установите его для генерации изображений.")
+                return False
+            
+            failed = [result.stderr for result in results if result.returncode != 0]
+            if failed:
+                print(f"Ошибка генерации изображения: {''.join(failed)}")
+                return False
+            
+            for dot_path, (_, filename) in zip(dot_paths, graphs):
+                shutil.move(dot_path + '.png', filename)
+                print(f"Изображение графа сохранено в файл: {filename}")
+        return True
     except Exception as e:
-        print(f"Ошибка чтения конфигурации: {e}")
-        return 1
-    
-    if 'DEFAULT' not in config:
-        print("Ошибка: не найден раздел [DEFAULT]")
-        return 1
-    
-    config_dict = dict(config['DEFAULT'])
-    
-    # 2. Извлечение параметров
-    package_name = config_dict.get('package_name', '')
-    repository_url = config_dict.get('repository_url', '')
-    package_version = config_dict.get('package_version', '')
-    max_depth = config_dict.get('max_depth', '')
-    exclude_substring = config_dict.get('exclude_substring', '')
-    
-    # 3. Валидация параметров
+        print(f"Ошибка сохранения изображения: {e}")
+        return False
+
+_CONFIG_KEYS = ('package_name', 'repository_url', 'package_version', 'max_depth', 'exclude_substring')
+
+def validate_config(config_dict):
+    """Проверка обязательных параметров; возвращает список ошибок"""
     errors = []
-    if not package_name:
+    if not config_dict.get('package_name', ''):
         errors.append("Не указано имя пакета")
-    if not repository_url:
+    if not config_dict.get('repository_url', ''):
         errors.append("Не указан URL репозитория")
+    return errors
+
+def print_config(config_dict):
+    """Вывод параметров конфигурации"""
+    print("Параметры конфигурации:")
+    for key in _CONFIG_KEYS:
+        print(f"  {key}: {config_dict.get(key, '')}")
+
+def run_stage1(config_path):
+    """Выполнение этапа 1"""
+    print("=== ЭТАП 1: МИНИМАЛЬНЫЙ ПРОТОТИП С КОНФИГУРАЦИЕЙ ===")
+    
+    # 1. Чтение INI конфигурации
+    config_dict = load_config(config_path)
+    if config_dict is None:
+        return 1
     
+    # 2. Валидация параметров
+    errors = validate_config(config_dict)
     if errors:
         print("Ошибки конфигурации:")
         for error in errors:
             print(f"  - {error}")
         return 1
     
-    # 4. Вывод параметров (требование этапа)
-    print("Параметры конфигурации:")
-    print(f"  package_name: {package_name}")
-    print(f"  repository_url: {repository_url}")
-    print(f"  package_version: {package_version}")
-    print(f"  max_depth: {max_depth}")
-    print(f"  exclude_substring: {exclude_substring}")
+    # 3. Вывод параметров (требование этапа)
+    print_config(config_dict)
     
-    # 5. Обработка ошибок параметров
+    # 4. Обработка ошибок параметров
+    max_depth = config_dict.get('max_depth', '')
     try:
         if max_depth:
             depth = int(max_depth)
@@ -321,23 +576,10 @@ def run_stage2(config_path):
     print("=== ЭТАП 2: СБОР ДАННЫХ ===")
     
     # 1. Чтение конфигурации
-    if not os.path.exists(config_path):
-        print(f"Ошибка: файл {config_path} не найден")
+    config_dict = load_config(config_path)
+    if config_dict is None:
         return 1
     
-    config = configparser.ConfigParser()
-    try:
-        config.read(config_path)
-    except Exception as e:
-        print(f"Ошибка чтения конфигурации: {e}")
-        return 1
-    
-    if 'DEFAULT' not in config:
-        print("Ошибка: не найден раздел [DEFAULT]")
-        return 1
-    
-    config_dict = dict(config['DEFAULT'])
-    
     # 2. Извлечение параметров
     package = config_dict.get('package_name', 'serde')
     repo_url = config_dict.get('repository_url', 'file://test_repo.txt')
@@ -352,8 +594,7 @@ def run_stage2(config_path):
     # 4. Вывод прямых зависимостей (требование этапа)
     print(f"Прямые зависимости пакета {package}:")
     if deps:
-        for dep in deps:
-            print(f"  - {dep}")
+        sys.stdout.write('\n'.join(f"  - {dep}" for dep in deps) + '\n')
     else:
         print("  Зависимости не найдены")
     
@@ -364,32 +605,19 @@ def run_stage3(config_path):
     print("=== ЭТАП 3: ОСНОВНЫЕ ОПЕРАЦИИ ===")
     
     # 1. Чтение конфигурации
-    if not os.path.exists(config_path):
-        print(f"Ошибка: файл {config_path} не найден")
-        return 1
-    
-    config = configparser.ConfigParser()
-    try:
-        config.read(config_path)
-    except Exception as e:
-        print(f"Ошибка чтения конфигурации: {e}")
-        return 1
-    
-    if 'DEFAULT' not in config:
-        print("Ошибка: не найден раздел [DEFAULT]")
+    config_dict = load_config(config_path)
+    if config_dict is None:
         return 1
     
-    config_dict = dict(config['DEFAULT'])
-    
     # 2. Извлечение параметров
     package = config_dict.get('package_name', 'serde')
     repo_url = config_dict.get('repository_url', 'file://test_repo.txt')
     version = config_dict.get('package_version', '1.0')
-    max_depth = int(config_dict.get('max_depth', 0)) or float('inf')
+    max_depth = int(config_dict.get('max_depth', 0)) or sys.maxsize
     exclude_substring = config_dict.get('exclude_substring', '')
     
     print(f"Построение графа зависимостей для {package} версии {version}")
-    print(f"Максимальная глубина: {max_depth if max_depth != float('inf') else 'не ограничена'}")
+    print(f"Максимальная глубина: {max_depth if max_depth != sys.maxsize else 'не ограничена'}")
     if exclude_substring:
         print(f"Исключаемая подстрока: '{exclude_substring}'")
     
@@ -406,13 +634,14 @@ def run_stage3(config_path):
     cycles = graph_builder.get_cycles()
     
     print("\nПостроенный граф зависимостей:")
-    for pkg, deps in graph.items():
-        print(f"  {pkg} -> {', '.join(deps)}")
+    lines = [f"  {pkg} -> {', '.join(deps)}" for pkg, deps in graph.items()]
+    if lines:
+        sys.stdout.write('\n'.join(lines) + '\n')
     
     if cycles:
         print(f"\nОбнаружены циклические зависимости ({len(cycles)}):")
-        for i, cycle in enumerate(cycles, 1):
-            print(f"  Цикл {i}: {' -> '.join(cycle)}")
+        lines = [f"  Цикл {i}: {' -> '.join(cycle)}" for i, cycle in enumerate(cycles, 1)]
+        sys.stdout.write('\n'.join(lines) + '\n')
     else:
         print("\nЦиклические зависимости не обнаружены")
     
@@ -423,28 +652,15 @@ def run_stage4(config_path):
     print("=== ЭТАП 4: ДОПОЛНИТЕЛЬНЫЕ ОПЕРАЦИИ ===")
     
     # 1. Чтение конфигурации
-    if not os.path.exists(config_path):
-        print(f"Ошибка: файл {config_path} не найден")
-        return 1
-    
-    config = configparser.ConfigParser()
-    try:
-        config.read(config_path)
-    except Exception as e:
-        print(f"Ошибка чтения конфигурации: {e}")
-        return 1
-    
-    if 'DEFAULT' not in config:
-        print("Ошибка: не найден раздел [DEFAULT]")
+    config_dict = load_config(config_path)
+    if config_dict is None:
         return 1
     
-    config_dict = dict(config['DEFAULT'])
-    
     # 2. Извлечение параметров
     package = config_dict.get('package_name', 'serde')
     repo_url = config_dict.get('repository_url', 'file://test_repo.txt')
     version = config_dict.get('package_version', '1.0')
-    max_depth = int(config_dict.get('max_depth', 0)) or float('inf')
+    max_depth = int(config_dict.get('max_depth', 0)) or sys.maxsize
     
     print(f"Анализ зависимостей для {package} версии {version}")
     
@@ -457,15 +673,15 @@ def run_stage4(config_path):
     # 4. Порядок загрузки зависимостей
     load_order = graph_builder.get_load_order()
     print(f"\nПорядок загрузки зависимостей для {package}:")
-    for i, pkg in enumerate(load_order, 1):
-        print(f"  {i}. {pkg}")
+    if load_order:
+        lines = [f"  {i}. {pkg}" for i, pkg in enumerate(load_order, 1)]
+        sys.stdout.write('\n'.join(lines) + '\n')
     
     # 5. Обратные зависимости
     reverse_deps = graph_builder.get_reverse_dependencies(package)
     print(f"\nОбратные зависимости для {package} (пакеты, зависящие от него):")
     if reverse_deps:
-        for dep in reverse_deps:
-            print(f"  - {dep}")
+        sys.stdout.write('\n'.join(f"  - {dep}" for dep in reverse_deps) + '\n')
     else:
         print("  Обратные зависимости не найдены")
     
@@ -484,39 +700,29 @@ def run_stage5(config_path):
     print("=== ЭТАП 5: ВИЗУАЛИЗАЦИЯ ===")
     
     # 1. Чтение конфигурации
-    if not os.path.exists(config_path):
-        print(f"Ошибка: файл {config_path} не найден")
-        return 1
-    
-    config = configparser.ConfigParser()
-    try:
-        config.read(config_path)
-    except Exception as e:
-        print(f"Ошибка чтения конфигурации: {e}")
+    config_dict = load_config(config_path)
+    if config_dict is None:
         return 1
     
-    if 'DEFAULT' not in config:
-        print("Ошибка: не найден раздел [DEFAULT]")
-        return 1
-    
-    config_dict = dict(config['DEFAULT'])
-    
     # 2. Извлечение параметров
     package = config_dict.get('package_name', 'serde')
     repo_url = config_dict.get('repository_url', 'file://test_repo.txt')
     version = config_dict.get('package_version', '1.0')
-    max_depth = int(config_dict.get('max_depth', 0)) or float('inf')
+    max_depth = int(config_dict.get('max_depth', 0)) or sys.maxsize
     exclude_substring = config_dict.get('exclude_substring', '')
     
     print(f"Визуализация графа зависимостей для {package} версии {version}")
     
     # 3. Демонстрация для трех различных пакетов
     demo_packages = ['serde', 'tokio', 'reqwest']
+    # Один репозиторий на все пакеты: файл разбирается один раз, кэши общие
+    repo = CargoRepository(repo_url)
+    
+    graphs = []
     
     for demo_package in demo_packages:
         print(f"\n--- Визуализация для пакета: {demo_package} ---")
         
-        repo = CargoRepository(repo_url)
         graph_builder = DependencyGraph(repo)
         
         graph_builder.build_graph_bfs_recursive(
@@ -525,17 +731,16 @@ def run_stage5(config_path):
         
         # Вывод графа в формате Graphviz
         graph_builder.display_graph()
+        graphs.append((graph_builder, f"{demo_package}_dependencies.png"))
         
-        # Сохранение изображения
-        image_filename = f"{demo_package}_dependencies.png"
-        if graph_builder.save_graph_image(image_filename):
-            print(f"Изображение сохранено: {image_filename}")
-        else:
-            print("Не удалось сохранить изображение (требуется Graphviz)")
-        
-        print(f"Граф содержит {len(graph_builder.get_graph())} узлов")
+        print(f"Граф содержит {len(graph_builder.iter_graph())} узлов")
+    
+    # 4. Сохранение изображений одним запуском Graphviz
+    print()
+    if not save_graph_images(graphs):
+        print("Не удалось сохранить изображения (требуется Graphviz)")
     
-    # 4. Сравнение с реальными инструментами
+    # 5. Сравнение с реальными инструментами
     print(f"\nСравнение с штатными инструментами визуализации Cargo:")
     print("  Отличия могут быть вызваны:")
     print("  - Разными алгоритмами обхода графа")